@@ -4,16 +4,46 @@ Raspberry Pi Camera Control Web Interface
 カメラ設定をWebブラウザから制御するためのHTTPサーバー
 """
 
+import email.utils
+import fcntl
 import json
 import os
+import shutil
+import signal
+import socket
 import sys
 import time
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import subprocess
 import logging
 import wifi_manager
+import settings_store
+
+# Picamera2のインポート (Raspberry Pi環境のみ)
+try:
+    from picamera2 import Picamera2
+except ImportError:
+    Picamera2 = None
+
+# orjson (C実装・bytesを直接返す) があれば高速なシリアライズに使う
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_dumps(obj):
+    """JSONをbytesへシリアライズ"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+def _json_loads(data):
+    """JSON(bytes/str)をパース"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 # ログ設定
 logging.basicConfig(
@@ -26,10 +56,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# 設定ファイルのパス
-SETTINGS_FILE = '/home/pi/camera_settings.json'
+# 設定ファイルのパス（tmpfs上。SDカードとの同期はsettings_storeが行う）
+SETTINGS_FILE = settings_store.SETTINGS_FILE
 PHOTOS_DIR = '/home/pi/photos'
 
+# 静的ファイルのメモリキャッシュ {path: (mtime_ns, bytes)}
+_STATIC_CACHE = {}
+
+def _read_cached(path):
+    """静的ファイルを読み込む（mtimeが変わらない限りキャッシュを返す）"""
+    st = os.stat(path)
+    entry = _STATIC_CACHE.get(path)
+    if entry is not None and entry[0] == st.st_mtime_ns:
+        return entry[1]
+    with open(path, 'rb') as f:
+        data = f.read()
+    _STATIC_CACHE[path] = (st.st_mtime_ns, data)
+    return data
+
 # デフォルト設定
 DEFAULT_SETTINGS = {
     'iso': 'auto',
@@ -53,9 +97,82 @@ DEFAULT_SETTINGS = {
     'enable_timestamp': False
 }
 
+class CameraControlServer(ThreadingHTTPServer):
+    """リクエストごとにスレッドを立てて同時I/Oを可能にするHTTPサーバー"""
+    # 終了時にワーカースレッドを待たない（systemd stopを速くする）
+    daemon_threads = True
+    # ポーリングクライアントが溜まってもacceptを取りこぼさないよう深めに
+    request_queue_size = 16
+
+    def server_bind(self):
+        # 複数ワーカープロセスで同じポートをlistenし、
+        # カーネルにaccept負荷分散させる（GILは1プロセス1個なので）
+        if hasattr(socket, 'SO_REUSEPORT'):
+            try:
+                self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            except OSError:
+                pass
+        super().server_bind()
+
 class CameraControlHandler(BaseHTTPRequestHandler):
     """カメラ制御用HTTPリクエストハンドラー"""
-    
+
+    # UIが1秒間隔でポーリングするので、接続を使い回してTCPハンドシェイクを省く
+    protocol_version = 'HTTP/1.1'
+    # 小さいJSON応答を遅延なく送るためNagleを無効化
+    disable_nagle_algorithm = True
+
+    def _send_json(self, obj, status=200):
+        """JSONレスポンスを送信（Content-Length付き・keep-alive対応）
+
+        send_response/send_header/end_headersは小さなwriteを繰り返すので、
+        ヘッダーと本文を結合して1回のwriteで送る。
+        """
+        body = _json_dumps(obj)
+        message = self.responses.get(status, ('OK', ''))[0]
+        header = (
+            f"{self.protocol_version} {status} {message}\r\n"
+            f"Server: {self.version_string()}\r\n"
+            f"Date: {self.date_time_string()}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n"
+            "\r\n"
+        ).encode('latin-1')
+        self.log_request(status, len(body))
+        self.wfile.write(header + body)
+
+    @staticmethod
+    def _etag_for(st):
+        return f'W/"{st.st_size:x}-{int(st.st_mtime):x}"'
+
+    def _client_cache_valid(self, st):
+        """条件付きリクエストを検証し、304を返した場合はTrue"""
+        etag = self._etag_for(st)
+        if self.headers.get('If-None-Match') == etag:
+            valid = True
+        else:
+            valid = False
+            ims = self.headers.get('If-Modified-Since')
+            if ims:
+                try:
+                    ims_dt = email.utils.parsedate_to_datetime(ims)
+                    valid = ims_dt.timestamp() >= int(st.st_mtime)
+                except (TypeError, ValueError):
+                    pass
+
+        if valid:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+        return valid
+
+    def _send_cache_validators(self, st):
+        """200応答に付けるキャッシュ検証ヘッダー"""
+        self.send_header('Last-Modified',
+                         email.utils.formatdate(st.st_mtime, usegmt=True))
+        self.send_header('ETag', self._etag_for(st))
+
     def do_GET(self):
         """GETリクエストの処理"""
         parsed_path = urlparse(self.path)
@@ -68,6 +185,8 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             self.serve_settings()
         elif parsed_path.path == '/api/status':
             self.serve_status()
+        elif parsed_path.path == '/api/poll':
+            self.serve_poll()
         elif parsed_path.path == '/api/photos':
             self.serve_photo_list()
         elif parsed_path.path.startswith('/photos/'):
@@ -97,24 +216,34 @@ class CameraControlHandler(BaseHTTPRequestHandler):
     def serve_main_page(self):
         """メインページのHTML配信"""
         try:
-            with open('index.html', 'rb') as f:
-                content = f.read()
-            
+            st = os.stat('index.html')
+            if self._client_cache_valid(st):
+                return
+            content = _read_cached('index.html')
+
             self.send_response(200)
             self.send_header('Content-type', 'text/html; charset=utf-8')
+            self.send_header('Content-length', str(len(content)))
+            self.send_header('Cache-Control', 'public, max-age=60')
+            self._send_cache_validators(st)
             self.end_headers()
             self.wfile.write(content)
         except FileNotFoundError:
             self.send_error(404, "index.html not found")
-            
+
     def serve_css(self):
         """CSS配信"""
         try:
-            with open('style.css', 'rb') as f:
-                content = f.read()
-            
+            st = os.stat('style.css')
+            if self._client_cache_valid(st):
+                return
+            content = _read_cached('style.css')
+
             self.send_response(200)
             self.send_header('Content-type', 'text/css; charset=utf-8')
+            self.send_header('Content-length', str(len(content)))
+            self.send_header('Cache-Control', 'public, max-age=60')
+            self._send_cache_validators(st)
             self.end_headers()
             self.wfile.write(content)
         except FileNotFoundError:
@@ -123,11 +252,7 @@ class CameraControlHandler(BaseHTTPRequestHandler):
     def serve_settings(self):
         """設定情報をJSON形式で配信"""
         settings = load_settings()
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(settings).encode('utf-8'))
+        self._send_json(settings)
     
     def serve_status(self):
         """システム状態をJSON形式で配信"""
@@ -141,16 +266,45 @@ class CameraControlHandler(BaseHTTPRequestHandler):
                 'timestamp': time.time(),
                 'photos_count': len(get_photo_list())
             }
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(status).encode('utf-8'))
-            
+
+            self._send_json(status)
+
         except Exception as e:
             logger.error(f"Status check error: {e}")
             self.send_error(500)
 
+    def serve_poll(self):
+        """ポーリング用の集約エンドポイント
+
+        設定・状態・写真一覧・Wi-Fi状態を1往復で返す。
+        個別のエンドポイントも互換性のため残している。
+        """
+        try:
+            settings = load_settings()
+            photos = get_photo_list()
+
+            status = {
+                'monitoring_active': settings.get('monitoring_enabled', True),
+                'timestamp': time.time(),
+                'photos_count': len(photos)
+            }
+
+            wifi = wifi_manager.get_wifi_status()
+            ap_settings = wifi_manager.get_saved_ap_settings()
+            wifi['ap_ssid'] = ap_settings['ssid']
+            wifi['ap_password'] = ap_settings['password']
+
+            self._send_json({
+                'settings': settings,
+                'status': status,
+                'photos': photos,
+                'wifi': wifi
+            })
+
+        except Exception as e:
+            logger.error(f"Poll error: {e}")
+            self.send_error(500)
+
     # ... (省略) ...
 
     def restart_monitoring(self):
@@ -164,19 +318,13 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             # プロセス再起動は不要（ポーリングで検知）
             response = {'success': True}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response)
             
         except Exception as e:
             logger.error(f"Restart monitoring error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
 
     def stop_monitoring(self):
         """監視プロセス停止（フラグ無効化）"""
@@ -189,49 +337,65 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             # プロセス停止は不要（ループ内で待機）
             response = {'success': True}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response)
             
         except Exception as e:
             logger.error(f"Stop monitoring error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
     
     def serve_photo_list(self):
         """写真一覧をJSON形式で配信"""
         photos = get_photo_list()
-        
-        response = {'photos': photos}
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(response).encode('utf-8'))
+        self._send_json({'photos': photos})
     
     def serve_photo(self, filename):
         """写真ファイルを配信"""
         photo_path = os.path.join(PHOTOS_DIR, filename)
-        
+
         if not os.path.exists(photo_path):
             self.send_error(404)
             return
-        
+
         try:
             with open(photo_path, 'rb') as f:
-                content = f.read()
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'image/jpeg')
-            self.send_header('Content-length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-            
+                st = os.fstat(f.fileno())
+                size = st.st_size
+
+                # 撮影済み写真は不変なので、ブラウザのキャッシュが
+                # 有効なら本体を送らず304で済ませる
+                if self._client_cache_valid(st):
+                    return
+
+                self.send_response(200)
+                self.send_header('Content-type', 'image/jpeg')
+                self.send_header('Content-length', str(size))
+                self._send_cache_validators(st)
+                self.end_headers()
+
+                # sendfileでカーネル内コピー（ユーザー空間へ読み込まない）
+                offset = 0
+                try:
+                    self.wfile.flush()
+                    while offset < size:
+                        sent = os.sendfile(self.wfile.fileno(), f.fileno(),
+                                           offset, size - offset)
+                        if sent == 0:
+                            break
+                        offset += sent
+                except OSError as e:
+                    if offset:
+                        # 送信途中の失敗。先頭から再送するとレスポンスが
+                        # 壊れるので、この接続は打ち切る
+                        logger.error(f"sendfile aborted mid-transfer: {e}")
+                        self.close_connection = True
+                        return
+                    # sendfile非対応のソケットでは64KBずつストリーミング
+                    # （10MP JPEGを丸ごとbytesに読み込まない。オフセット版
+                    # sendfileはファイル位置を動かさないのでseek不要）
+                    shutil.copyfileobj(f, self.wfile, 64 * 1024)
+
         except Exception as e:
             logger.error(f"Photo serve error: {e}")
             self.send_error(500)
@@ -241,26 +405,20 @@ class CameraControlHandler(BaseHTTPRequestHandler):
         try:
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
-            new_settings = json.loads(post_data.decode('utf-8'))
+            new_settings = _json_loads(post_data)
             
             # 設定を保存
             save_settings(new_settings)
             
             response = {'success': True}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response)
             
         except Exception as e:
             logger.error(f"Settings update error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
     
     def capture_photo(self):
         """手動写真撮影"""
@@ -269,8 +427,48 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             timestamp = time.time()
             filename = f"manual_{timestamp:.6f}.jpg"
             photo_path = os.path.join(PHOTOS_DIR, filename)
-            
-            # libcameraコマンドで撮影
+
+            # まずはプロセス内のPicamera2で撮影（subprocess起動なし）
+            picam2 = _get_camera()
+            if picam2 is not None:
+                try:
+                    controls = {}
+                    if settings['shutter_speed'] != 'auto':
+                        try:
+                            if int(settings['shutter_speed']) > 0:
+                                controls['ExposureTime'] = int(settings['shutter_speed'])
+                        except ValueError:
+                            logger.warning(f"Invalid shutter speed value: {settings['shutter_speed']}")
+                    if settings.get('iso', 'auto') != 'auto':
+                        try:
+                            if int(settings['iso']) > 0:
+                                controls['AnalogueGain'] = int(settings['iso']) / 100
+                        except ValueError:
+                            logger.warning(f"Invalid ISO value: {settings['iso']}")
+                    controls['AwbMode'] = _AWB_MODES.get(settings.get('white_balance', 'auto'), 0)
+
+                    # set_controlsは再構成で破棄されるため、コントロールは
+                    # 静止画構成に埋め込んで切り替えと同時に適用させる
+                    still_config = picam2.create_still_configuration(
+                        main={"size": (int(settings['width']), int(settings['height']))},
+                        controls=controls
+                    )
+                    # JPEG品質（libcamera-stillフォールバックの--qualityと揃える）
+                    try:
+                        picam2.options['quality'] = int(settings['quality'])
+                    except (KeyError, ValueError):
+                        pass
+                    picam2.switch_mode_and_capture_file(still_config, photo_path)
+
+                    self._send_json({'success': True, 'filename': filename})
+                    return
+                except Exception as e:
+                    logger.error(f"Picamera2 manual capture failed, falling back: {e}")
+                finally:
+                    # 撮影のたびに解放する（libcamera-stillと同じ振る舞い）
+                    _release_camera()
+
+            # フォールバック: libcameraコマンドで撮影
             cmd = [
                 'libcamera-still',
                 '-o', photo_path,
@@ -313,19 +511,13 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             else:
                 response = {'success': False, 'error': result.stderr}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response)
             
         except Exception as e:
             logger.error(f"Capture error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
     
     def restart_monitoring(self):
         """監視プロセス再開"""
@@ -334,28 +526,25 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             settings = load_settings()
             settings['monitoring_enabled'] = True
             save_settings(settings)
-            
-            result = subprocess.run(['sudo', 'systemctl', 'restart', 'shutter-trigger'], 
-                                  capture_output=True, text=True)
-            
-            if result.returncode == 0:
+
+            # 監視プロセスがカメラを取得できるよう、念のため先に解放する
+            _release_camera()
+
+            # 出力は使わないのでposix_spawnで軽く起動（詳細はjournalに出る）
+            rc = _run_quiet(['sudo', 'systemctl', 'restart', 'shutter-trigger'])
+
+            if rc == 0:
                 response = {'success': True}
             else:
-                response = {'success': False, 'error': result.stderr}
+                response = {'success': False, 'error': f'systemctl exited with code {rc}'}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response)
             
         except Exception as e:
             logger.error(f"Restart monitoring error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
 
     def stop_monitoring(self):
         """監視プロセス停止"""
@@ -365,28 +554,21 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             settings['monitoring_enabled'] = False
             save_settings(settings)
             
-            # プロセスを停止
-            result = subprocess.run(['sudo', 'systemctl', 'stop', 'shutter-trigger'], 
-                                  capture_output=True, text=True)
-            
-            if result.returncode == 0:
+            # プロセスを停止（出力は使わないのでposix_spawnで軽く起動）
+            rc = _run_quiet(['sudo', 'systemctl', 'stop', 'shutter-trigger'])
+
+            if rc == 0:
                 response = {'success': True}
             else:
-                response = {'success': False, 'error': result.stderr}
+                response = {'success': False, 'error': f'systemctl exited with code {rc}'}
             
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response)
             
         except Exception as e:
             logger.error(f"Stop monitoring error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
 
     def serve_wifi_status(self):
         """Wi-Fiステータス配信"""
@@ -395,18 +577,15 @@ class CameraControlHandler(BaseHTTPRequestHandler):
         ap_settings = wifi_manager.get_saved_ap_settings()
         status['ap_ssid'] = ap_settings['ssid']
         status['ap_password'] = ap_settings['password']
-        
-        self.send_response(200)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
-        self.wfile.write(json.dumps(status).encode('utf-8'))
+
+        self._send_json(status)
 
     def switch_wifi_mode(self):
         """Wi-Fiモード切り替え処理"""
         try:
             content_length = int(self.headers['Content-Length'])
             post_data = self.rfile.read(content_length)
-            data = json.loads(post_data.decode('utf-8'))
+            data = _json_loads(post_data)
             
             mode = data.get('mode')
             
@@ -419,14 +598,7 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             else:
                 result = {'success': False, 'message': 'Unknown mode'}
             
-            if result['success']:
-                self.send_response(200)
-            else:
-                self.send_response(500)
-                
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(result).encode('utf-8'))
+            self._send_json(result, 200 if result['success'] else 500)
             
             # モード切り替え成功時にネットワーク再起動が走るため、
             # レスポンス送信後に少し待ってからプロセス終了等の処理が必要かも？
@@ -436,18 +608,92 @@ class CameraControlHandler(BaseHTTPRequestHandler):
             logger.error(f"Wi-Fi switch error: {e}")
             response = {'success': False, 'error': str(e)}
             
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps(response).encode('utf-8'))
+            self._send_json(response, 500)
+
+# 解析済み設定のキャッシュ（mtimeが変わらない限り再パースしない）
+_SETTINGS_CACHE = {'mtime': None, 'data': None}
+
+# ThreadingHTTPServer化に伴い、同時POSTの読み書きを直列化するロック
+_SETTINGS_LOCK = threading.Lock()
+
+# 手動撮影用のPicamera2インスタンス
+# 撮影が終わるたびに_release_cameraで解放すること。カメラ取得は排他
+# なので、持ちっぱなしにすると監視プロセス(shutter-trigger)が
+# Picamera2を初期化できなくなる
+_CAMERA = None
+_CAMERA_LOCK = threading.Lock()
+
+# libcameraのカメラ取得は排他なので、Picamera2での手動撮影は
+# 親ワーカーだけに限定する（fork時に子でFalseにする）。
+# 子ワーカーに届いたcaptureはlibcamera-stillフォールバックで処理される。
+_IS_CAMERA_OWNER = True
+
+# libcamera AwbMode列挙値への対応表（UIのwhite_balance値 → enum）
+_AWB_MODES = {
+    'auto': 0,
+    'tungsten': 2,
+    'fluorescent': 3,
+    'daylight': 5,
+    'cloudy': 6,
+    'shade': 6,  # libcameraにshadeはないのでcloudyで代用
+}
+
+def _run_quiet(argv):
+    """出力を見ないコマンドをposix_spawnで実行して終了コードを返す
+
+    subprocess.runのfork+execと違い、COWページのコピーが発生しない
+    vfork相当のパスを通るので1GBメモリのPiでは起動が軽い。
+    """
+    try:
+        pid = os.posix_spawnp(argv[0], argv, dict(os.environ))
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status)
+    except OSError as e:
+        logger.error(f"Failed to spawn {argv[0]}: {e}")
+        return -1
+
+def _get_camera():
+    """手動撮影用のPicamera2インスタンスを返す（初期化失敗時はNone）"""
+    global _CAMERA
+    if Picamera2 is None or not _IS_CAMERA_OWNER:
+        return None
+    with _CAMERA_LOCK:
+        if _CAMERA is None:
+            try:
+                camera = Picamera2()
+                camera.configure(camera.create_preview_configuration())
+                camera.start()
+                _CAMERA = camera
+                logger.info("Picamera2 initialized for manual capture")
+            except Exception as e:
+                # 監視プロセスがカメラを掴んでいる場合など
+                logger.warning(f"Picamera2 not available for manual capture: {e}")
+                return None
+    return _CAMERA
+
+def _release_camera():
+    """手動撮影用カメラを解放する（監視プロセスが取得できるように）"""
+    global _CAMERA
+    with _CAMERA_LOCK:
+        if _CAMERA is not None:
+            try:
+                _CAMERA.stop()
+                _CAMERA.close()
+            except Exception as e:
+                logger.warning(f"Failed to release manual-capture camera: {e}")
+            _CAMERA = None
 
 def load_settings():
     """設定ファイルから設定を読み込み"""
     try:
         if os.path.exists(SETTINGS_FILE):
-            with open(SETTINGS_FILE, 'r') as f:
-                settings = json.load(f)
-            
+            mtime = os.stat(SETTINGS_FILE).st_mtime_ns
+            if mtime == _SETTINGS_CACHE['mtime']:
+                return _SETTINGS_CACHE['data'].copy()
+
+            with open(SETTINGS_FILE, 'rb') as f:
+                settings = _json_loads(f.read())
+
             # 欠落しているキーをデフォルト値で補完
             for key, default_value in DEFAULT_SETTINGS.items():
                 if key not in settings:
@@ -457,8 +703,10 @@ def load_settings():
             settings['enable_multiple_exposure'] = settings.get('enable_multiple_exposure', False) in (True, 'True', 'true', 'on')
             settings['enable_2in1_composition'] = settings.get('enable_2in1_composition', False) in (True, 'True', 'true', 'on')
             settings['enable_timestamp'] = settings.get('enable_timestamp', False) in (True, 'True', 'true', 'on')
-            
-            return settings
+
+            _SETTINGS_CACHE['mtime'] = mtime
+            _SETTINGS_CACHE['data'] = settings
+            return settings.copy()
         else:
             return DEFAULT_SETTINGS.copy()
     except Exception as e:
@@ -468,35 +716,65 @@ def load_settings():
 def save_settings(settings):
     """設定をファイルに保存"""
     try:
-        # 既存設定を読み込んで更新
-        current_settings = load_settings()
-        current_settings.update(settings)
-        
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(current_settings, f, indent=2)
-        
+        with _SETTINGS_LOCK:
+            # ワーカープロセス間の排他はflockで行う
+            # （os.replaceでinodeが変わるため、本体ではなく.lockファイルに掛ける）
+            with open(SETTINGS_FILE + '.lock', 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # 既存設定を読み込んで更新
+                    current_settings = load_settings()
+                    current_settings.update(settings)
+
+                    # 書き込み前にキャッシュを無効化（次回読み込みで再パース）
+                    _SETTINGS_CACHE['mtime'] = None
+
+                    # 一時ファイルに書いてからrenameで差し替え（書きかけ状態を防ぐ）
+                    tmp_file = SETTINGS_FILE + '.tmp'
+                    with open(tmp_file, 'w') as f:
+                        json.dump(current_settings, f, indent=2)
+                    os.replace(tmp_file, SETTINGS_FILE)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
         logger.info("Settings saved successfully")
-        
+
     except Exception as e:
         logger.error(f"Settings save error: {e}")
         raise
 
+# 写真一覧のキャッシュ（ファイル追加・削除でディレクトリのmtimeが変わる）
+_PHOTO_EXTS = frozenset({'jpg', 'jpeg', 'png'})
+_PHOTO_CACHE = {'mtime': -1, 'list': []}
+
 def get_photo_list():
     """写真ディレクトリから写真一覧を取得"""
     try:
         if not os.path.exists(PHOTOS_DIR):
             os.makedirs(PHOTOS_DIR, exist_ok=True)
             return []
-        
+
+        dir_mtime = os.stat(PHOTOS_DIR).st_mtime_ns
+        if dir_mtime == _PHOTO_CACHE['mtime']:
+            return _PHOTO_CACHE['list']
+
         photos = []
-        for filename in os.listdir(PHOTOS_DIR):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                photos.append(filename)
-        
+        with os.scandir(PHOTOS_DIR) as it:
+            for entry in it:
+                # rpartitionは拡張子ぶんの小さな文字列しか作らない
+                # （lower()+endswith(tuple)のような全長コピーをしない）
+                ext = entry.name.rpartition('.')[2]
+                if ext and ext.lower() in _PHOTO_EXTS:
+                    photos.append(entry.name)
+
         # 新しい順にソート
         photos.sort(reverse=True)
-        return photos[:50]  # 最新50枚まで
-        
+        photos = photos[:50]  # 最新50枚まで
+
+        _PHOTO_CACHE['mtime'] = dir_mtime
+        _PHOTO_CACHE['list'] = photos
+        return photos
+
     except Exception as e:
         logger.error(f"Photo list error: {e}")
         return []
@@ -506,7 +784,16 @@ def main():
     try:
         # 必要なディレクトリを作成
         os.makedirs(PHOTOS_DIR, exist_ok=True)
-        
+
+        # SDカードの設定をtmpfsへ展開し、終了時に書き戻す
+        settings_store.restore()
+
+        def _on_sigterm(signum, frame):
+            settings_store.persist()
+            sys.exit(0)
+
+        signal.signal(signal.SIGTERM, _on_sigterm)
+
         # --- 起動時のネットワーク設定適用 ---
         try:
             settings = load_settings()
@@ -529,15 +816,48 @@ def main():
             logger.error(f"Failed to apply boot network settings: {e}")
         # ------------------------------------
         
-        # HTTPサーバーを起動
-        server_address = ('0.0.0.0', 8001)
-        httpd = HTTPServer(server_address, CameraControlHandler)
-        
         logger.info(f"Camera control server starting on port 8001")
         logger.info(f"Access via: http://localhost:8001")
-        
+
+        # コアごとにワーカープロセスをfork（SO_REUSEPORTでaccept分散）
+        # 親もそのままワーカーとして動く
+        # bindはfork後に各ワーカーが自分で行う。fork前にbindすると
+        # 全員が1個のリスニングソケットを共有するだけで、SO_REUSEPORTの
+        # カーネルによるaccept分散が働かない
+        global _IS_CAMERA_OWNER
+        worker_pids = []
+        workers = os.cpu_count() or 1
+        for _ in range(workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                # 子ワーカーはPicamera2を掴まない（カメラ所有は親のみ。
+                # 複数ワーカーで取得し合うと手動撮影が不安定になる）
+                _IS_CAMERA_OWNER = False
+                worker_pids = []
+                break  # 子プロセスは自分のソケットでserve_foreverへ
+            worker_pids.append(pid)
+
+        if worker_pids:
+            # 落ちた子をpid指定で回収する（ゾンビ放置を防ぐ）。
+            # SIG_IGNや無差別waitpid(-1)は_run_quietやsubprocess.runの
+            # 終了コード回収を壊すので、ワーカーのpidだけを待つ
+            def _reap_workers(signum, frame):
+                for wpid in worker_pids[:]:
+                    try:
+                        done, _ = os.waitpid(wpid, os.WNOHANG)
+                    except ChildProcessError:
+                        done = wpid
+                    if done:
+                        worker_pids.remove(wpid)
+                        logger.warning(f"Worker {wpid} exited")
+            signal.signal(signal.SIGCHLD, _reap_workers)
+
+        # HTTPサーバーを起動（スレッド化して写真配信中も他のリクエストを処理）
+        server_address = ('0.0.0.0', 8001)
+        httpd = CameraControlServer(server_address, CameraControlHandler)
+
         httpd.serve_forever()
-        
+
     except KeyboardInterrupt:
         logger.info("Server stopped by user")
     except Exception as e:
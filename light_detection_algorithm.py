@@ -2,9 +2,11 @@ import os
 import time
 import json
 import logging
-from PIL import Image, ImageStat
+import threading
+from PIL import Image
 import numpy as np
 import subprocess
+import settings_store
 
 # Picamera2のインポート (Raspberry Pi環境のみ)
 try:
@@ -15,10 +17,59 @@ except ImportError:
     except ImportError:
         Picamera2 = None
 
+# MappedArrayはコールバック内でフレームをコピーなしで参照するために使う
+try:
+    from picamera2 import MappedArray
+except ImportError:
+    MappedArray = None
+
 logger = logging.getLogger(__name__)
 
-# 設定ファイルのパス
-SETTINGS_FILE = '/home/pi/camera_settings.json'
+# Numbaのインポート (任意依存 - あれば判定ロジックをネイティブコード化)
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# 設定ファイルのパス（tmpfs上。SDカードとの同期はsettings_storeが行う）
+SETTINGS_FILE = settings_store.SETTINGS_FILE
+
+# Picamera2の生成はセンサー再プローブとV4L2バッファ再確保を伴う（数百ms）ため、
+# プロセス内ではシングルトンとして使い回す
+_CAMERA = None
+_CAMERA_LOCK = threading.Lock()
+
+
+def get_camera():
+    '''プロセス内で共有するPicamera2インスタンスを返す（未対応環境ではNone）'''
+    global _CAMERA
+    if Picamera2 is None:
+        return None
+    with _CAMERA_LOCK:
+        if _CAMERA is None:
+            _CAMERA = Picamera2()
+    return _CAMERA
+
+
+def _decide_light_change(current, last, threshold):
+    '''
+    輝度変化の判定本体
+    明るくなる変化のみ、変化率が閾値以上かつ変化量5以上で検知
+    （変化量5：暗闇でのノイズ(±1以下)と実際のシャッター開放(5以上)を区別）
+    '''
+    diff = current - last
+    if diff < 0:
+        return False
+    if last > 0:
+        change_percent = diff / last * 100.0
+    else:
+        change_percent = diff * 100.0
+    return change_percent >= threshold and diff >= 5.0
+
+
+if njit is not None:
+    _decide_light_change = njit(cache=True, fastmath=True)(_decide_light_change)
+    _decide_light_change(0.0, 1.0, 30.0)  # 起動時にコンパイルを済ませておく
 
 class LightDetector:
     '''
@@ -35,7 +86,9 @@ class LightDetector:
         self.last_capture_time = 0
         self.picam2 = None
         self.camera_config = None
-        
+        self.still_config = None
+        self._settings_mtime = None
+
         self.load_settings()
         
         # Picamera2の初期化
@@ -47,38 +100,87 @@ class LightDetector:
     def _initialize_picamera(self):
         '''Picamera2を初期化してストリームを開始する'''
         try:
-            if self.picam2 is not None:
-                self.release_camera()
-                
-            self.picam2 = Picamera2()
-            # 撮影兼用の解像度（1280x720）でストリームを開始
-            # モード切替なしで即座に保存可能
+            # シングルトンを使い回す（close/再生成はしない）
+            self.picam2 = get_camera()
+            try:
+                self.picam2.stop()  # configureには停止状態が必要
+            except Exception:
+                pass
+            # 検知用ストリームは320x240のYUV420
+            # Yプレーンがそのまま輝度なので、RGB変換もグレースケール化も不要
+            # （1280x720 RGB888比でフレームあたりのデータ量は約1/36）
             self.camera_config = self.picam2.create_preview_configuration(
-                main={"size": (1280, 720), "format": "RGB888"}
+                main={"size": (320, 240), "format": "YUV420"}
+            )
+            # 撮影用の高解像度設定はここで作ってキャッシュしておく
+            # （撮影時はswitch_modeで切り替える）
+            # 注意: picamera2のフォーマット名はメモリ上のバイト順の逆。
+            # "BGR888"がR,G,B順の配列になる（"RGB888"だと赤と青が入れ替わる）
+            self.still_config = self.picam2.create_still_configuration(
+                main={"size": (1280, 720), "format": "BGR888"}
             )
             self.picam2.configure(self.camera_config)
             self.picam2.start()
             logger.info("Picamera2 initialized and started.")
-            # 露出安定化のための待機
-            time.sleep(2.0)
+            # 露出が安定するまで待機（固定2秒ではなくメタデータを見て抜ける）
+            self._wait_for_exposure(max_wait=1.5)
             return True
         except Exception as e:
-            logger.error(f"Failed to initialize Picamera2: {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            # スタックトレースはDEBUG時のみ整形（再試行ループで毎回払うコストを避ける）
+            logger.error("Failed to initialize Picamera2: %s", e,
+                         exc_info=logger.isEnabledFor(logging.DEBUG))
             self.picam2 = None
             return False
 
+    def _wait_for_exposure(self, max_wait=1.5):
+        '''AEが収束するまでメタデータをポーリングして待つ（通常300ms以下）
+
+        ExposureTimeは初回フレームから非ゼロなので、値の有無ではなく
+        AeLockedが立つか、露出時間・ゲインが連続フレームで動かなく
+        なったことを収束とみなす。収束前に検知を始めると、AEの明るさ
+        ランプが光量変化として誤検知される（固定2秒sleepの代替）。
+        '''
+        deadline = time.monotonic() + max_wait
+        prev = None
+        stable_frames = 0
+        while time.monotonic() < deadline:
+            try:
+                # capture_metadataは次フレームまでブロックするので
+                # これ自体がフレーム間隔のウェイトになる
+                metadata = self.picam2.capture_metadata()
+            except Exception:
+                break
+            if metadata.get('AeLocked'):
+                return
+            exposure = metadata.get('ExposureTime', 0)
+            gain = metadata.get('AnalogueGain', 0.0)
+            if prev is not None and exposure == prev[0] \
+                    and abs(gain - prev[1]) <= prev[1] * 0.01:
+                stable_frames += 1
+                if stable_frames >= 3:
+                    return
+            else:
+                stable_frames = 0
+            prev = (exposure, gain)
+
     def __del__(self):
         self.release_camera()
 
     def load_settings(self):
-        '''設定ファイルから最新の設定を読み込む'''
+        '''設定ファイルから最新の設定を読み込む
+
+        検知ループの周回ごとに呼ばれるため、mtimeが変わっていない場合は
+        読み込み・パースをスキップする
+        '''
         try:
             if os.path.exists(SETTINGS_FILE):
+                mtime = os.stat(SETTINGS_FILE).st_mtime_ns
+                if mtime == self._settings_mtime:
+                    return
                 with open(SETTINGS_FILE, 'r') as f:
                     settings = json.load(f)
-                
+                self._settings_mtime = mtime
+
                 # 設定の更新
                 self.detection_threshold = settings.get('detection_threshold', 30)
                 self.detection_interval = settings.get('detection_interval', 0.1) # デフォルトを高速化
@@ -97,7 +199,7 @@ class LightDetector:
                 try:
                     self.picam2.start()
                     logger.info("Picamera2 stream started.")
-                    time.sleep(1.0)
+                    self._wait_for_exposure(max_wait=1.0)
                     return True
                 except Exception as e:
                     # 既に動作中などの場合
@@ -106,16 +208,51 @@ class LightDetector:
         return False
 
     def release_camera(self):
-        '''カメラリソースを完全に解放する（高画質撮影の前など）'''
+        '''検知ストリームを停止する
+
+        インスタンスは使い回すためcloseしない。closeすると次回の
+        _initialize_picameraでセンサー再プローブ（数百ms）が走る。
+        '''
         if self.picam2:
             try:
                 self.picam2.stop()
-                self.picam2.close() # デバイスを閉じる
-                logger.info("Picamera2 stream stopped and closed.")
+                logger.info("Picamera2 stream stopped.")
             except Exception as e:
-                logger.error(f"Failed to stop/close Picamera2: {e}")
-            finally:
-                self.picam2 = None # オブジェクトを破棄して確実に解放
+                logger.error(f"Failed to stop Picamera2: {e}")
+
+    def install_frame_callback(self, on_trigger):
+        '''フレーム到着ごとに輝度変化を判定するpost_callbackを仕掛ける
+
+        ポーリング（detection_interval間隔のcapture_array）と違い、
+        カメラスレッド上で全フレームをコピーなしで判定できるため、
+        取りこぼしがなく、メインループはイベント待ちで眠っていられる。
+        検知時はon_trigger()を呼ぶ（スレッドを跨ぐのでEvent等を渡すこと）。
+        Returns: 仕掛けられたかどうか (bool)
+        '''
+        if self.picam2 is None or MappedArray is None:
+            return False
+
+        width, height = self.camera_config['main']['size']
+
+        def _cb(request):
+            if not self.monitoring_enabled:
+                return
+            try:
+                with MappedArray(request, "main") as m:
+                    arr = m.array
+                    # 検知ストリーム（YUV420のYプレーン＝2次元）以外、
+                    # 例えば静止画撮影中の高解像度フレームは無視する
+                    if arr.ndim != 2 or arr.shape[1] != width:
+                        return
+                    brightness = self.calculate_brightness(arr[:height, :width])
+            except Exception:
+                return
+            if self.detect_light_change(brightness) and self.should_capture():
+                on_trigger()
+
+        self.picam2.post_callback = _cb
+        logger.info("Per-frame detection callback installed.")
+        return True
 
     def capture_frame(self):
         '''
@@ -125,20 +262,22 @@ class LightDetector:
         '''
         if self.picam2:
             try:
-                # NumPy配列として画像を取得 (XRGB8888 -> RGB変換が必要かもだが、輝度計算だけならそのまま使える)
+                # NumPy配列として画像を取得
                 # capture_arrayはデフォルトでメインストリームから取得
                 frame = self.picam2.capture_array()
-                
-                # PIL Imageに変換 (計算ロジックの互換性維持のため)
-                # XRGB配列は (H, W, 4) なので、RGB (H, W, 3) に変換するか、そのまま扱う
-                # PIL.Image.fromarray は numpy array を受け取れる
+
+                if frame.ndim == 2:
+                    # YUV420: 先頭の H×W バイトがYプレーン（＝輝度そのもの）
+                    # スライスはビューなのでコピーは発生しない
+                    height, width = self.camera_config['main']['size'][1], self.camera_config['main']['size'][0]
+                    return frame[:height, :width]
+
                 # XRGBの場合、アルファチャンネル(またはパディング)が含まれるため、RGBに変換
-                if frame.shape[2] == 4:
+                if frame.ndim == 3 and frame.shape[2] == 4:
                     frame = frame[:, :, :3] # 最初の3チャンネル(RGB)を取り出す（BGRの可能性もあるが輝度変化検知なら許容範囲）
-                    # Picamera2のXRGBは通常BGR順のことが多いが、輝度変化を見るだけなら色は問わない
-                
-                image = Image.fromarray(frame)
-                return image
+
+                # ndarrayのまま返す（PIL変換のコピーを省く。輝度計算はNumPyで行う）
+                return frame
             except Exception as e:
                 logger.error(f"Picamera2 capture failed: {e}")
                 return None
@@ -166,9 +305,8 @@ class LightDetector:
                 return None
                 
             try:
-                frame = Image.open(temp_file)
-                frame.load()
-                return frame
+                with Image.open(temp_file) as img:
+                    return np.asarray(img)
             except Exception:
                 return None
             
@@ -177,14 +315,12 @@ class LightDetector:
 
     def calculate_brightness(self, frame):
         '''
-        フレームの平均輝度を計算する
+        フレーム(ndarray)の平均輝度を計算する
+        PIL変換なしでNumPyの一括演算1回で済ませる
         '''
-        # グレースケールに変換
-        gray = frame.convert('L')
-        # 平均輝度を計算
-        stat = ImageStat.Stat(gray)
-        brightness = stat.mean[0]
-        return brightness
+        # 輝度変化の検知にフル解像度は不要なので4画素おきに間引く（処理量1/16）
+        sample = np.asarray(frame)[::4, ::4]
+        return float(sample.mean(dtype=np.float32))
 
     def detect_light_change(self, current_brightness):
         '''
@@ -196,30 +332,17 @@ class LightDetector:
             self.last_brightness = current_brightness
             return False
 
-        # 変化量（正の値：明るくなった、負の値：暗くなった）
-        change_amount = current_brightness - self.last_brightness
-        
-        # 暗くなる変化は無視（フィルムカメラのシャッターが閉じるとき）
-        if change_amount < 0:
-            self.last_brightness = current_brightness
-            return False
-        
-        # 輝度変化率を計算（明るくなる方向のみ）
-        if self.last_brightness > 0:
-            change_percent = change_amount / self.last_brightness * 100
-        else:
-            change_percent = change_amount * 100 
+        triggered = _decide_light_change(
+            float(current_brightness),
+            float(self.last_brightness),
+            float(self.detection_threshold)
+        )
 
-        logger.debug(f"Brightness: {current_brightness:.2f}, Last: {self.last_brightness:.2f}, Change: +{change_percent:.2f}% (+{change_amount:.2f}), Threshold: {self.detection_threshold}%")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Brightness: {current_brightness:.2f}, Last: {self.last_brightness:.2f}, Threshold: {self.detection_threshold}%, Triggered: {triggered}")
 
-        # 変化率が閾値以上 かつ 変化量が5以上の場合のみ検知
-        # 変化量5：暗闇でのノイズ（±1以下）と実際のシャッター開放（5以上）を区別
-        if change_percent >= self.detection_threshold and change_amount >= 5:
-            self.last_brightness = current_brightness
-            return True
-        
         self.last_brightness = current_brightness
-        return False
+        return triggered
 
     def should_capture(self):
         '''
@@ -1,26 +1,114 @@
+import email.utils
 import http.server
+import json
 import socketserver
 import os
 
+# orjson (C implementation, returns bytes) is used when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _json_dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
 PORT = 8000
 DIRECTORY = "/home/pi/photos"
 
 # Ensure directory exists
 os.makedirs(DIRECTORY, exist_ok=True)
 
+# In-memory cache for the gallery page, invalidated on mtime change
+_STATIC_CACHE = {}
+
+def _read_cached(path):
+    st = os.stat(path)
+    entry = _STATIC_CACHE.get(path)
+    if entry is not None and entry[0] == st.st_mtime_ns:
+        return entry[1]
+    with open(path, 'rb') as f:
+        data = f.read()
+    _STATIC_CACHE[path] = (st.st_mtime_ns, data)
+    return data
+
+# Photo listing cache: the directory mtime changes whenever a file is
+# added or removed, so it doubles as the invalidation key.
+_PHOTO_EXTS = frozenset({'jpg', 'jpeg', 'png'})
+_PHOTO_CACHE = {'mtime': -1, 'list': []}
+
+def _photo_list():
+    dir_mtime = os.stat(DIRECTORY).st_mtime_ns
+    if dir_mtime == _PHOTO_CACHE['mtime']:
+        return _PHOTO_CACHE['list']
+
+    entries = []
+    with os.scandir(DIRECTORY) as it:
+        for e in it:
+            ext = e.name.rpartition('.')[2]
+            if ext and ext.lower() in _PHOTO_EXTS:
+                entries.append((e.stat().st_mtime, e.name))
+    entries.sort(reverse=True)
+
+    files = [name for _, name in entries]
+    _PHOTO_CACHE['mtime'] = dir_mtime
+    _PHOTO_CACHE['list'] = files
+    return files
+
 class Handler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, directory=DIRECTORY, **kwargs)
-    
+
+    def copyfile(self, source, outputfile):
+        # Zero-copy photo serving: let the kernel push file pages straight
+        # to the socket instead of read()/write() through Python.
+        try:
+            in_fd = source.fileno()
+            size = os.fstat(in_fd).st_size
+            outputfile.flush()
+        except (OSError, AttributeError):
+            # Non-regular file (e.g. BytesIO body)
+            super().copyfile(source, outputfile)
+            return
+        offset = 0
+        try:
+            while offset < size:
+                sent = os.sendfile(outputfile.fileno(), in_fd, offset, size - offset)
+                if sent == 0:
+                    break
+                offset += sent
+        except OSError:
+            if offset:
+                # Failed mid-transfer: resending from the start would
+                # corrupt the response, so abort the connection instead.
+                self.close_connection = True
+                raise
+            # Socket without sendfile support. Offset-style sendfile never
+            # advanced the file position, so the fallback starts at byte 0.
+            super().copyfile(source, outputfile)
+
     def do_GET(self):
         if self.path == '/' or self.path == '/index.html':
             # Serve custom gallery page
             try:
-                with open('/home/pi/gallery.html', 'rb') as f:
-                    content = f.read()
+                st = os.stat('/home/pi/gallery.html')
+                lm = email.utils.formatdate(st.st_mtime, usegmt=True)
+                ims = self.headers.get('If-Modified-Since')
+                if ims == lm:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                content = _read_cached('/home/pi/gallery.html')
                 self.send_response(200)
                 self.send_header('Content-type', 'text/html; charset=utf-8')
                 self.send_header('Content-length', len(content))
+                self.send_header('Cache-Control', 'public, max-age=60')
+                self.send_header('Last-Modified', lm)
                 self.end_headers()
                 self.wfile.write(content)
             except FileNotFoundError:
@@ -29,22 +117,24 @@ class Handler(http.server.SimpleHTTPRequestHandler):
         elif self.path == '/api/photos':
             # Return JSON list of photos
             try:
-                files = [f for f in os.listdir(DIRECTORY) if f.lower().endswith(('.jpg', '.jpeg', '.png'))]
-                files.sort(key=lambda x: os.path.getmtime(os.path.join(DIRECTORY, x)), reverse=True)
-                
-                import json
+                files = _photo_list()
+
+                body = _json_dumps(files)
                 self.send_response(200)
                 self.send_header('Content-type', 'application/json')
+                self.send_header('Content-length', str(len(body)))
                 self.end_headers()
-                self.wfile.write(json.dumps(files).encode('utf-8'))
+                self.wfile.write(body)
             except Exception as e:
                 self.send_error(500, str(e))
         else:
             # Serve photos and other files normally
             super().do_GET()
 
-class ReusableTCPServer(socketserver.TCPServer):
+class ReusableTCPServer(socketserver.ThreadingTCPServer):
     allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 16
 
 print(f"Starting Photo Server on port {PORT} serving {DIRECTORY}")
 with ReusableTCPServer(("", PORT), Handler) as httpd:
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Settings Store for Pi Camera
+設定ファイルをtmpfs(RAM)に置き、SDカードへの書き込みを起動/終了時だけにする
+"""
+
+import os
+import shutil
+import logging
+
+logger = logging.getLogger(__name__)
+
+# SDカード上の永続コピー
+PERSISTENT_FILE = '/home/pi/camera_settings.json'
+
+# tmpfsがあればRAM上で読み書きする
+# （設定トグルのたびにSDカードの消去ブロックを消費しない）
+_TMPFS_DIR = '/run/shm'
+
+if os.path.isdir(_TMPFS_DIR):
+    SETTINGS_FILE = os.path.join(_TMPFS_DIR, 'camera_settings.json')
+else:
+    # tmpfsがない環境（開発マシンなど）では従来通りSDカード上で読み書き
+    SETTINGS_FILE = PERSISTENT_FILE
+
+
+def restore():
+    """起動時: SDカードの永続コピーをtmpfsへ展開する（冪等）"""
+    if SETTINGS_FILE == PERSISTENT_FILE:
+        return
+    try:
+        if os.path.exists(PERSISTENT_FILE) and not os.path.exists(SETTINGS_FILE):
+            shutil.copy2(PERSISTENT_FILE, SETTINGS_FILE)
+            logger.info("Settings restored from SD card to tmpfs")
+    except Exception as e:
+        logger.error(f"Failed to restore settings: {e}")
+
+
+def persist():
+    """終了時: tmpfs上の設定をSDカードへ書き戻す"""
+    if SETTINGS_FILE == PERSISTENT_FILE:
+        return
+    try:
+        if os.path.exists(SETTINGS_FILE):
+            tmp_file = PERSISTENT_FILE + '.tmp'
+            shutil.copy2(SETTINGS_FILE, tmp_file)
+            os.replace(tmp_file, PERSISTENT_FILE)
+            logger.info("Settings persisted to SD card")
+    except Exception as e:
+        logger.error(f"Failed to persist settings: {e}")
@@ -8,14 +8,24 @@ import os
 import sys
 import time
 import json
+import heapq
 import logging
 import signal
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from light_detection_algorithm import LightDetector
+import settings_store
 from PIL import Image, ImageDraw, ImageFont, ImageChops
 import numpy as np
 
+# simplejpegのインポート (任意依存 - あればlibjpeg-turboで高速エンコード)
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None
+
 # ログ設定
 logging.basicConfig(
     level=logging.INFO,
@@ -34,15 +44,51 @@ class ShutterTriggerSystem:
     '''シャッター検知・撮影システム'''
     
     def __init__(self):
+        # camera_controlより先に起動した場合に備えて設定をtmpfsへ展開
+        settings_store.restore()
+
         self.detector = LightDetector()
         self.photos_dir = '/home/pi/photos'
-        self.settings_file = '/home/pi/camera_settings.json'
+        self.settings_file = settings_store.SETTINGS_FILE
         self.running = True
         self.last_frame = None # 合成用フレーム (多重露光/2in1共通) - PIL Image object
-        self.last_frame_path = None # 1枚目の画像パス
+        self.last_frame_name = None # 1枚目のベース名（COMPOSITEファイル名に使用）
         
+        # タイムスタンプ用フォントは一度だけ読み込む
+        # （truetypeは毎回TTF解析が走り、Piでは数十msかかる）
+        try:
+            self._ts_font = ImageFont.truetype("DejaVuSans-Bold.ttf", 50)
+        except IOError:
+            self._ts_font = ImageFont.load_default()
+
+        # 日時文字列に使う文字は固定なので、影付きグリフを起動時に
+        # 一度だけラスタライズしておく（撮影時は貼り付けるだけ）
+        self._glyph_atlas = self._build_glyph_atlas()
+
         os.makedirs(self.photos_dir, exist_ok=True)
-        
+
+        # 写真の(mtime, path)をヒープで管理する
+        # 起動時に1回だけスキャンし、以降は撮影のたびに追記するので、
+        # クリーンアップや統計のためのディレクトリ再走査が不要になる
+        self._photo_heap = []
+        self._photo_bytes = 0
+        self._scan_photo_dir()
+
+        # 設定のmtimeキャッシュ（変更がない限り再読み込みしない）
+        self._settings_cache = (0, None)
+
+        # ファイル名用の連番（タイムスタンプと組で一意になる。
+        # 撮影のたびにos.urandomでエントロピーを引く必要はない）
+        self._seq = 0
+
+        # 撮影後の加工・エンコード・保存は専用ワーカー1本に逃がす
+        # （検知ループはフレーム取得だけ済ませてすぐ次の検知に戻れる）
+        self._io_pool = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='photo-io')
+        # 合成用フレームと写真ヒープはワーカーとメインループの両方から
+        # 触るのでロックで保護する
+        self._state_lock = threading.Lock()
+
         signal.signal(signal.SIGTERM, self.signal_handler)
         signal.signal(signal.SIGINT, self.signal_handler)
         
@@ -55,8 +101,15 @@ class ShutterTriggerSystem:
     def load_camera_settings(self) -> dict:
         try:
             if os.path.exists(self.settings_file):
+                # mtimeが変わっていなければ前回のパース結果を返す
+                # （撮影のたびに呼ばれるが、設定変更は稀）
+                mtime = os.stat(self.settings_file).st_mtime_ns
+                if mtime == self._settings_cache[0] and self._settings_cache[1] is not None:
+                    return self._settings_cache[1]
                 with open(self.settings_file, 'r') as f:
-                    return json.load(f)
+                    settings = json.load(f)
+                self._settings_cache = (mtime, settings)
+                return settings
             else:
                 return {
                     'iso': 100,
@@ -73,66 +126,117 @@ class ShutterTriggerSystem:
             logger.error(f"Failed to load camera settings: {e}")
             return {}
     
+    # 影のオフセット（ピクセル）
+    _GLYPH_SHADOW = 2
+    # 日時文字列 "%Y/%m/%d %H:%M:%S" に現れる文字の全て
+    _TS_CHARS = '0123456789/: '
+
+    def _build_glyph_atlas(self):
+        '''タイムスタンプ用の影付きグリフをRGBAタイルとして事前ラスタライズする'''
+        try:
+            bbox = self._ts_font.getbbox(self._TS_CHARS)
+            tile_h = bbox[3] + self._GLYPH_SHADOW
+            atlas = {}
+            for ch in self._TS_CHARS:
+                advance = int(self._ts_font.getlength(ch) + 0.5)
+                tile = Image.new('RGBA', (advance + self._GLYPH_SHADOW, tile_h), (0, 0, 0, 0))
+                draw = ImageDraw.Draw(tile)
+                draw.text((self._GLYPH_SHADOW, self._GLYPH_SHADOW), ch,
+                          font=self._ts_font, fill=(0, 0, 0, 255)) # 影
+                draw.text((0, 0), ch, font=self._ts_font, fill=(255, 255, 255, 255)) # 本体
+                atlas[ch] = tile
+            return atlas
+        except Exception as e:
+            # 古いPillowやビットマップフォントではdraw.textにフォールバック
+            logger.warning(f"Glyph atlas unavailable, falling back to draw.text: {e}")
+            return None
+
     def _add_timestamp(self, img_pil, timestamp):
         dt_object = datetime.fromtimestamp(timestamp)
         date_text = dt_object.strftime("%Y/%m/%d %H:%M:%S")
-        
-        draw = ImageDraw.Draw(img_pil)
-        
-        # フォント設定 (Raspberry Pi環境に存在する可能性が高いフォントを使用)
-        try:
-            font = ImageFont.truetype("DejaVuSans-Bold.ttf", 50)
-        except IOError:
-            font = ImageFont.load_default()
-        
-        # テキストの描画
+
+        # テキストの描画位置
         text_x = 10
         text_y = img_pil.height - 70
-        
-        # 影付きの文字を描画 (見やすくするため)
-        draw.text((text_x + 2, text_y + 2), date_text, font=font, fill=(0, 0, 0)) # 影
-        draw.text((text_x, text_y), date_text, font=font, fill=(255, 255, 255)) # 本体
-        
+
+        if self._glyph_atlas is not None:
+            # 事前ラスタライズ済みのタイルを貼るだけ
+            # （撮影ごとのグリフラスタライズと2回のdraw.textを省く）
+            x = text_x
+            for ch in date_text:
+                tile = self._glyph_atlas[ch]
+                img_pil.paste(tile, (x, text_y), tile)
+                x += tile.width - self._GLYPH_SHADOW
+        else:
+            draw = ImageDraw.Draw(img_pil)
+            font = self._ts_font
+
+            # 影付きの文字を描画 (見やすくするため)
+            draw.text((text_x + 2, text_y + 2), date_text, font=font, fill=(0, 0, 0)) # 影
+            draw.text((text_x, text_y), date_text, font=font, fill=(255, 255, 255)) # 本体
+
         logger.info("Timestamp added to photo.")
         return img_pil
 
-    def capture_high_quality_photo(self) -> str:
+    def capture_high_quality_photo(self):
+        '''検知ループから呼ばれる撮影の入口
+
+        ここではフレームの取得だけを行い、加工・JPEGエンコード・保存は
+        _io_poolのワーカーへ渡す。検知ループはエンコード（Piで数百ms）を
+        待たずに次の検知へ戻れるので、連写の取りこぼしが減る。
+        '''
         try:
             settings = self.load_camera_settings()
-            
+
             timestamp = time.time()
-            random_id = os.urandom(4).hex().upper()
-            
-            # 合成モードの場合、一時ファイル名を使用
+            self._seq += 1
+            photo_id = f"{self._seq:08d}"
+
             is_composition_mode = settings.get('enable_multiple_exposure', False) or settings.get('enable_2in1_composition', False)
-            
-            if is_composition_mode and self.last_frame is None:
-                # 1枚目の画像として保存
-                filename = f"Camera_{timestamp}_{random_id}_1st.jpg"
-            elif is_composition_mode and self.last_frame is not None:
-                # 2枚目の画像として保存
-                filename = f"Camera_{timestamp}_{random_id}_2nd.jpg"
-            else:
-                # 通常撮影
-                filename = f"Camera_{timestamp}_{random_id}.jpg"
-                
+
+            filename = f"Camera_{timestamp}_{photo_id}.jpg"
             filepath = os.path.join(self.photos_dir, filename)
-            
-            # --- 超高速撮影: ストリームからそのまま保存 ---
+
+            # 加工（合成・タイムスタンプ）が必要かどうか
+            needs_processing = is_composition_mode or settings.get('enable_timestamp', False)
+
+            # --- 撮影: ディスク経由せずメモリ上のndarrayとして取得 ---
             picam2 = self.detector.picam2
-            
+            frame = None  # PIL Image（加工が必要な場合のみ作る）
+
             if picam2 is not None:
-                # 現在のストリームからそのまま保存（モード切替なし = 爆速）
                 try:
-                    # capture_file で現在のフレームを直接JPEGとして保存
-                    picam2.capture_file(filepath)
-                    logger.info(f"Instant capture completed: {filepath}")
-                    
+                    # 検知ストリームは320x240 YUVなので、キャッシュ済みの
+                    # 高解像度設定に切り替えて撮影し、すぐ検知モードへ戻す
+                    # リクエストAPIで直接バッファを受け取り、配列化したら
+                    # すぐreleaseしてバッファをカメラキューに返す
+                    # （*_capture_array系ヘルパーの追加コピー・後処理を省く）
+                    still_config = getattr(self.detector, 'still_config', None)
+                    try:
+                        if still_config is not None:
+                            req = picam2.switch_mode_and_capture_request(still_config)
+                        else:
+                            req = picam2.capture_request()
+                        try:
+                            arr = req.make_array("main")
+                        finally:
+                            req.release()
+                    except AttributeError:
+                        # 古いpicamera2にはリクエストAPIがない
+                        if still_config is not None:
+                            arr = picam2.switch_mode_and_capture_array(still_config, "main")
+                        else:
+                            arr = picam2.capture_array("main")
+                    # 無加工ならPILを介さずndarrayのまま渡す
+                    # （_save_jpegが配列を直接エンコードできる）
+                    frame = Image.fromarray(arr) if needs_processing else arr
+                    logger.info("Instant capture completed (in-memory)")
+
                 except Exception as e:
                     logger.error(f"Picamera2 fast capture failed: {e}")
-                    return None
+                    return
             else:
-                # フォールバック: libcamera-still（遅い）
+                # フォールバック: libcamera-still（遅い・ディスク経由）
                 logger.warning("Picamera2 not available, using slow libcamera-still")
                 cmd = [
                     'libcamera-still',
@@ -144,181 +248,243 @@ class ShutterTriggerSystem:
                     '--nopreview',
                     '--immediate'  # 即座に撮影
                 ]
-                
+
                 # AWB設定
                 cmd.extend(['--awb', settings.get('white_balance', 'auto')])
-                
+
                 self.detector.release_camera()
                 try:
                     result = subprocess.run(cmd, capture_output=True, text=True)
                 finally:
                     self.detector.open_camera()
-                
+
                 if result.returncode != 0:
                     logger.error(f"libcamera-still failed: {result.stderr}")
-                    return None
-            
-            # 撮影した画像を読み込み (PIL)
-            try:
-                frame = Image.open(filepath)
-                frame.load() # メモリに読み込む
-            except Exception as e:
-                logger.error(f"Failed to read captured image with PIL: {e}")
-                return None
-            
-            if frame is None:
-                logger.error("Captured image is empty.")
-                return None
-            
-            # --- 画像処理と保存 ---
-            
-            if is_composition_mode:
-                if self.last_frame is None:
-                    # 1枚目の画像
-                    # 合成モード時は中間ファイルにタイムスタンプを入れない
-                    # ファイルは既にlibcamera-stillで保存されている
-                    
-                    self.last_frame = frame
-                    self.last_frame_path = filepath
-                    logger.info(f"First frame for composition saved: {filepath}")
-                    return None
-                
-                else:
-                    # 2枚目の画像
-                    # 合成処理
+                    return
+
+                # 加工が必要な場合だけデコードする
+                if needs_processing:
                     try:
-                        img1 = self.last_frame
-                        img2 = frame
-                        
-                        composite_img = None
-                        
-                        if settings.get('enable_2in1_composition', False):
-                            # 2in1: 横に並べる
-                            # 高さ合わせ
-                            w1, h1 = img1.size
-                            w2, h2 = img2.size
-                            target_h = min(h1, h2)
-                            
-                            img1_resized = img1.resize((int(w1 * target_h / h1), target_h))
-                            img2_resized = img2.resize((int(w2 * target_h / h2), target_h))
-                            
-                            composite_img = Image.new('RGB', (img1_resized.width + img2_resized.width, target_h))
-                            composite_img.paste(img1_resized, (0, 0))
-                            composite_img.paste(img2_resized, (img1_resized.width, 0))
-                            
-                        elif settings.get('enable_multiple_exposure', False):
-                            # 多重露光: ブレンド
-                            # 2枚目を1枚目のサイズに合わせる
-                            img2_resized = img2.resize(img1.size)
-                            composite_img = Image.blend(img1, img2_resized, 0.5)
-                        
-                        if composite_img is not None:
-                            # タイムスタンプ付与 (合成後の画像に)
-                            if settings.get('enable_timestamp', False):
-                                composite_img = self._add_timestamp(composite_img, timestamp)
-                            
-                            # 保存
-                            base_name = os.path.basename(self.last_frame_path).replace('_1st.jpg', '')
-                            result_filename = f"COMPOSITE_{base_name}.jpg"
-                            result_path = os.path.join(self.photos_dir, result_filename)
-                            
-                            composite_img.save(result_path, quality=settings.get('quality', 95))
-                            logger.info(f"Composite photo saved: {result_filename}")
-                            
-                            # 中間ファイルの削除
-                            try:
-                                if os.path.exists(self.last_frame_path):
-                                    os.remove(self.last_frame_path)
-                                # 2枚目のファイルも削除 (filepath)
-                                if os.path.exists(filepath):
-                                    os.remove(filepath)
-                            except Exception as e:
-                                logger.warning(f"Failed to remove temp file: {e}")
-                            
-                            # 状態リセット
-                            self.last_frame = None
-                            self.last_frame_path = None
-                            
-                            return result_filename
-                            
+                        frame = Image.open(filepath)
+                        frame.load() # メモリに読み込む
                     except Exception as e:
-                        logger.error(f"Composition error: {e}")
-                        self.last_frame = None
-                        self.last_frame_path = None
-                        return None
-            
-            else:
-                # 通常撮影
+                        logger.error(f"Failed to read captured image with PIL: {e}")
+                        return
+
+                    if is_composition_mode:
+                        # 合成の中間画像はメモリ上で持つので、ファイルは消す
+                        try:
+                            os.remove(filepath)
+                        except OSError:
+                            pass
+                else:
+                    # 無加工: libcamera-stillが既にJPEGを書いているので
+                    # ワーカーへ回す仕事はない
+                    if USE_CAMERA_MOCK or os.path.exists(filepath):
+                        if not USE_CAMERA_MOCK:
+                            self._register_photo(filepath)
+                        logger.info(f"Photo captured successfully: {filename}")
+                    else:
+                        logger.error("Photo file not created.")
+                    return
+
+            # --- 加工・エンコード・保存はワーカーに任せる ---
+            self._io_pool.submit(self._process_capture, frame, settings,
+                                 timestamp, photo_id, filepath, filename)
+
+        except Exception as e:
+            logger.error(f"Photo capture error: {e}")
+
+    def _save_jpeg(self, img, path, quality):
+        '''JPEGをディスクへ書き出す（PIL ImageとRGB ndarrayの両方を受ける）
+
+        simplejpegが入っていればlibjpeg-turboのSIMDエンコーダを使う
+        （PillowのエンコードよりPiで2〜4倍速い）。なければPillowで保存。
+        '''
+        is_pil = isinstance(img, Image.Image)
+        if simplejpeg is not None:
+            arr = np.asarray(img) if (not is_pil or img.mode == 'RGB') else None
+            if arr is not None and arr.ndim == 3 and arr.shape[2] == 3:
+                buf = simplejpeg.encode_jpeg(np.ascontiguousarray(arr),
+                                             quality=quality,
+                                             colorspace='RGB', fastdct=True)
+                with open(path, 'wb') as f:
+                    f.write(buf)
+                return
+        if not is_pil:
+            img = Image.fromarray(img)
+        # optimize=Trueの追加Huffmanパスは純粋なCPU消費なので使わない
+        # subsampling=2 (4:2:0) でエンコード量も抑える
+        img.save(path, quality=quality, optimize=False, subsampling=2)
+
+    def _process_capture(self, frame, settings, timestamp, photo_id,
+                         filepath, filename):
+        '''ワーカースレッドで実行する撮影後処理（合成・タイムスタンプ・保存）'''
+        try:
+            is_composition_mode = settings.get('enable_multiple_exposure', False) or settings.get('enable_2in1_composition', False)
+
+            if is_composition_mode:
+                with self._state_lock:
+                    if self.last_frame is None:
+                        # 1枚目の画像: メモリ上に保持するだけ（中間ファイルは作らない）
+                        self.last_frame = frame
+                        self.last_frame_name = f"Camera_{timestamp}_{photo_id}"
+                        logger.info("First frame for composition held in memory")
+                        return
+                    # 2枚目: 合成ペアを取り出して状態をリセット
+                    img1 = self.last_frame
+                    base_name = self.last_frame_name
+                    self.last_frame = None
+                    self.last_frame_name = None
+
+                # 合成処理
+                try:
+                    img2 = frame
+
+                    composite_img = None
+
+                    if settings.get('enable_2in1_composition', False):
+                        # 2in1: 横に並べる
+                        # 高さ合わせ
+                        w1, h1 = img1.size
+                        w2, h2 = img2.size
+                        target_h = min(h1, h2)
+
+                        # BILINEARを明示（Pillow-SIMD導入時にSIMD化されるフィルタ）
+                        # reducing_gapで縮小時はreduce()の前処理が入り高速化
+                        img1_resized = img1.resize((int(w1 * target_h / h1), target_h),
+                                                   resample=Image.BILINEAR, reducing_gap=2.0)
+                        img2_resized = img2.resize((int(w2 * target_h / h2), target_h),
+                                                   resample=Image.BILINEAR, reducing_gap=2.0)
+
+                        # Image.new+paste×2（キャンバス初期化＋コピー2回）の代わりに
+                        # NumPyの横連結1回でキャンバスを作る
+                        a = np.asarray(img1_resized, dtype=np.uint8)
+                        b = np.asarray(img2_resized, dtype=np.uint8)
+                        composite_img = Image.fromarray(
+                            np.concatenate([a, b], axis=1), 'RGB')
+
+                    elif settings.get('enable_multiple_exposure', False):
+                        # 多重露光: ブレンド
+                        # 2枚目を1枚目のサイズに合わせる
+                        img2_resized = img2.resize(img1.size,
+                                                   resample=Image.BILINEAR, reducing_gap=2.0)
+                        # Image.blend(0.5)相当をNumPyのuint16加算+シフトで行う
+                        # （float32の中間バッファを作らず1パスで済む）
+                        a = np.ascontiguousarray(np.asarray(img1, dtype=np.uint8))
+                        b = np.ascontiguousarray(np.asarray(img2_resized, dtype=np.uint8))
+                        blended = ((a.astype(np.uint16) + b + 1) >> 1).astype(np.uint8)
+                        composite_img = Image.fromarray(blended, 'RGB')
+
+                    if composite_img is not None:
+                        # タイムスタンプ付与 (合成後の画像に)
+                        if settings.get('enable_timestamp', False):
+                            composite_img = self._add_timestamp(composite_img, timestamp)
+
+                        # 保存（ここで初めてディスクに書く）
+                        result_filename = f"COMPOSITE_{base_name}.jpg"
+                        result_path = os.path.join(self.photos_dir, result_filename)
+
+                        self._save_jpeg(composite_img, result_path,
+                                        settings.get('quality', 95))
+                        self._register_photo(result_path)
+                        logger.info(f"Composite photo saved: {result_filename}")
+
+                except Exception as e:
+                    logger.error(f"Composition error: {e}")
+                return
+
+            # 通常撮影
+            with self._state_lock:
                 self.last_frame = None
-                self.last_frame_path = None
-                
-                # タイムスタンプ付与
+                self.last_frame_name = None
+
+            if frame is not None:
+                # タイムスタンプ付与（メモリ上で加工してからエンコード1回）
                 if settings.get('enable_timestamp', False):
                     frame = self._add_timestamp(frame, timestamp)
-                    # 上書き保存
-                    frame.save(filepath, quality=settings.get('quality', 95))
-                    
-                if USE_CAMERA_MOCK or os.path.exists(filepath):
-                    file_size = os.path.getsize(filepath) if not USE_CAMERA_MOCK else 0
-                    logger.info(f"Photo captured successfully: {filename} ({file_size} bytes)")
-                    return filename
-                else:
-                    logger.error("Photo file not created.")
-                    return None
-                
+                self._save_jpeg(frame, filepath, settings.get('quality', 95))
+
+            if os.path.exists(filepath):
+                file_size = os.path.getsize(filepath)
+                self._register_photo(filepath)
+                logger.info(f"Photo captured successfully: {filename} ({file_size} bytes)")
+            else:
+                logger.error("Photo file not created.")
+
         except Exception as e:
-            logger.error(f"Photo capture error: {e}")
-            self.last_frame = None # エラー時はリセット
-            return None
+            logger.error(f"Photo processing error: {e}")
+            with self._state_lock:
+                self.last_frame = None # エラー時はリセット
+                self.last_frame_name = None
     
-    def cleanup_old_photos(self, max_photos: int = 1000):
+    def _scan_photo_dir(self):
+        '''起動時に一度だけ写真ディレクトリを走査してヒープを初期化する'''
         try:
             if not os.path.exists(self.photos_dir):
                 return
-            
-            photos = []
-            for filename in os.listdir(self.photos_dir):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.txt')):
-                    filepath = os.path.join(self.photos_dir, filename)
-                    mtime = os.path.getmtime(filepath)
-                    photos.append((mtime, filepath, filename))
-            
-            photos.sort()
-            
-            if len(photos) > max_photos:
-                to_delete = photos[:-max_photos]
-                for mtime, filepath, filename in to_delete:
-                    try:
-                        os.remove(filepath)
-                        logger.info(f"Deleted old photo: {filename}")
-                    except Exception as e:
-                        logger.error(f"Failed to delete {filename}: {e}")
-                        
+
+            # scandirのDirEntryはstat結果をキャッシュしているので
+            # ファイルごとの追加stat()syscallが発生しない
+            with os.scandir(self.photos_dir) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.lower().endswith(('.jpg', '.jpeg', '.png', '.txt')):
+                        st = entry.stat()
+                        self._photo_heap.append((st.st_mtime, entry.path))
+                        self._photo_bytes += st.st_size
+
+            heapq.heapify(self._photo_heap)
+            logger.info(f"Photo index built: {len(self._photo_heap)} files, "
+                        f"{self._photo_bytes / (1024 * 1024):.2f}MB")
+
+        except Exception as e:
+            logger.error(f"Photo scan error: {e}")
+
+    def _register_photo(self, filepath):
+        '''撮影成功後に呼び、ヒープと合計サイズを更新する'''
+        try:
+            size = os.path.getsize(filepath)
+        except OSError:
+            return
+        with self._state_lock:
+            heapq.heappush(self._photo_heap, (time.time(), filepath))
+            self._photo_bytes += size
+
+    def cleanup_old_photos(self, max_photos: int = 1000):
+        try:
+            # ディレクトリ走査なし: 古い順に並んだヒープからpopするだけ
+            while True:
+                with self._state_lock:
+                    if len(self._photo_heap) <= max_photos:
+                        break
+                    mtime, filepath = heapq.heappop(self._photo_heap)
+                try:
+                    size = os.path.getsize(filepath)
+                    os.remove(filepath)
+                    with self._state_lock:
+                        self._photo_bytes -= size
+                    logger.info(f"Deleted old photo: {os.path.basename(filepath)}")
+                except FileNotFoundError:
+                    pass  # 外部で削除済み
+                except Exception as e:
+                    logger.error(f"Failed to delete {os.path.basename(filepath)}: {e}")
+
         except Exception as e:
             logger.error(f"Photo cleanup error: {e}")
-    
+
     def get_system_stats(self) -> dict:
         try:
-            photo_count = 0
-            total_size = 0
-            if os.path.exists(self.photos_dir):
-                for filename in os.listdir(self.photos_dir):
-                    if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.txt')):
-                        filepath = os.path.join(self.photos_dir, filename)
-                        if os.path.exists(filepath):
-                            photo_count += 1
-                            total_size += os.path.getsize(filepath)
-            
-            disk_usage = subprocess.run(['df', '-h', '/home/pi'], 
+            # カウンターを読むだけ（syscallなし）
+            disk_usage = subprocess.run(['df', '-h', '/home/pi'],
                                       capture_output=True, text=True)
-            
+
             return {
-                'photo_count': photo_count,
-                'total_size_mb': total_size / (1024 * 1024),
+                'photo_count': len(self._photo_heap),
+                'total_size_mb': self._photo_bytes / (1024 * 1024),
                 'detector_status': self.detector.get_status(),
                 'disk_info': disk_usage.stdout if disk_usage.returncode == 0 else 'N/A'
             }
-            
+
         except Exception as e:
             logger.error(f"Stats collection error: {e}")
             return {}
@@ -332,58 +498,75 @@ class ShutterTriggerSystem:
         
         last_cleanup_time = time.time()
         cleanup_interval = 3600
-        
+
         last_stats_time = time.time()
         stats_interval = 300
-        
+
+        # Picamera2があればフレーム到着駆動に切り替える
+        # （ポーリングのsleep刻みではなくEvent待ちで眠る）
+        self._wake = threading.Event()
+        event_driven = self.detector.install_frame_callback(self._wake.set)
+
         try:
             while self.running:
                 self.detector.load_settings()
-                
+
                 if not self.detector.monitoring_enabled:
                     logger.debug("Monitoring disabled, sleeping...")
                     time.sleep(1.0)
                     continue
-                
-                if not self.detector.should_capture():
-                    time.sleep(0.1)
-                    continue
-                
-                frame = self.detector.capture_frame()
-                if frame is None:
-                    logger.warning("Failed to capture detection frame")
-                    time.sleep(1)
-                    continue
-                
-                brightness = self.detector.calculate_brightness(frame)
-                light_changed = self.detector.detect_light_change(brightness)
-                
-                self.detector.update_capture_time()
-                
-                if light_changed:
-                    logger.info("Light change detected, capturing high-quality photo...")
-                    filename = self.capture_high_quality_photo()
-                    
-                    if filename:
-                        logger.info(f"Photo saved: {filename}")
-                    else:
-                        logger.error("Failed to capture photo")
-                
+
+                if event_driven:
+                    # 検知はカメラスレッドのコールバックが行う
+                    # ここでは起床を待つだけ（タイムアウトで定期処理に回る）
+                    triggered = self._wake.wait(timeout=1.0)
+                    self._wake.clear()
+
+                    if triggered and self.detector.should_capture():
+                        self.detector.update_capture_time()
+                        logger.info("Light change detected, capturing high-quality photo...")
+                        # 撮影だけ行い、保存完了はワーカー側でログ・登録される
+                        self.capture_high_quality_photo()
+                else:
+                    # フォールバック: 従来のポーリング検知
+                    if not self.detector.should_capture():
+                        time.sleep(0.1)
+                        continue
+
+                    frame = self.detector.capture_frame()
+                    if frame is None:
+                        logger.warning("Failed to capture detection frame")
+                        time.sleep(1)
+                        continue
+
+                    brightness = self.detector.calculate_brightness(frame)
+                    light_changed = self.detector.detect_light_change(brightness)
+
+                    self.detector.update_capture_time()
+
+                    if light_changed:
+                        logger.info("Light change detected, capturing high-quality photo...")
+                        # 撮影だけ行い、保存完了はワーカー側でログ・登録される
+                        self.capture_high_quality_photo()
+
                 current_time = time.time()
                 if current_time - last_cleanup_time > cleanup_interval:
                     self.cleanup_old_photos()
                     last_cleanup_time = current_time
-                
+
                 if current_time - last_stats_time > stats_interval:
                     stats = self.get_system_stats()
                     logger.info(f"System stats: {stats['photo_count']} photos, {stats['total_size_mb']:.2f}MB total")
                     last_stats_time = current_time
-                
-                time.sleep(self.detector.detection_interval)
-                
+
+                if not event_driven:
+                    time.sleep(self.detector.detection_interval)
+
         except Exception as e:
             logger.error(f"Main loop error: {e}")
         finally:
+            # 処理中の写真を書き終えてから終了する
+            self._io_pool.shutdown(wait=True)
             logger.info("Shutter trigger system stopped")
 
 def main():
@@ -5,15 +5,20 @@ AP Mode (Pi broadcasts Wi-Fi) / Tethering Mode (Pi connects to phone's Wi-Fi) 
 """
 
 import os
+import array
+import fcntl
+import socket
+import struct
 import subprocess
 import json
 import logging
 import time
+import settings_store
 
 logger = logging.getLogger(__name__)
 
-# 設定ファイルパス
-SETTINGS_FILE = '/home/pi/camera_settings.json'
+# 設定ファイルパス（tmpfs上。SDカードとの同期はsettings_storeが行う）
+SETTINGS_FILE = settings_store.SETTINGS_FILE
 HOSTAPD_CONF = '/etc/hostapd/hostapd.conf'
 DNSMASQ_CONF = '/etc/dnsmasq.d/picamera.conf'
 WPA_SUPPLICANT_CONF = '/etc/wpa_supplicant/wpa_supplicant.conf'
@@ -25,47 +30,93 @@ AP_DHCP_RANGE_START = '192.168.4.2'
 AP_DHCP_RANGE_END = '192.168.4.20'
 
 
+# get_current_mode の結果キャッシュ
+# モードはこのモジュール経由でしか変わらないので、短いTTLで
+# systemctlの起動（ステータスポーリングのたびに発生）をまとめる
+_MODE_CACHE_TTL = 2.0
+_mode_cache = {'ts': 0.0, 'val': None}
+
+
+def _invalidate_mode_cache():
+    """モード切り替え直後にキャッシュを捨てる"""
+    _mode_cache['ts'] = 0.0
+
+
 def get_current_mode():
     """
-    現在のWi-Fiモードを取得する
+    現在のWi-Fiモードを取得する（2秒間キャッシュ）
     Returns: 'ap' or 'tethering'
     """
+    now = time.monotonic()
+    if _mode_cache['val'] is not None and now - _mode_cache['ts'] < _MODE_CACHE_TTL:
+        return _mode_cache['val']
     try:
         # hostapd が動いているかどうかで判定
         result = subprocess.run(
             ['systemctl', 'is-active', 'hostapd'],
             capture_output=True, text=True
         )
-        if result.stdout.strip() == 'active':
-            return 'ap'
-        return 'tethering'
+        mode = 'ap' if result.stdout.strip() == 'active' else 'tethering'
+        _mode_cache['val'] = mode
+        _mode_cache['ts'] = now
+        return mode
     except Exception as e:
         logger.error(f"Failed to get Wi-Fi mode: {e}")
         return 'tethering'
 
 
+# ioctl番号（linux/sockios.h / wireless.h）
+_SIOCGIFADDR = 0x8915    # インターフェースのIPv4アドレス取得
+_SIOCGIWESSID = 0x8B1B   # 接続中のESSID取得
+
+
+def _get_interface_ip(ifname='wlan0'):
+    """ioctlでインターフェースのIPアドレスを取得する（subprocess不要）"""
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        packed = fcntl.ioctl(
+            sock.fileno(), _SIOCGIFADDR,
+            struct.pack('256s', ifname.encode()[:15])
+        )
+    return socket.inet_ntoa(packed[20:24])
+
+
+def _get_connected_ssid(ifname='wlan0'):
+    """ioctlで接続中のSSIDを取得する（subprocess不要）"""
+    essid = array.array('b', b'\0' * 32)
+    addr, length = essid.buffer_info()
+    req = struct.pack('16sLHH', ifname.encode()[:15], addr, length, 0)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        fcntl.ioctl(sock.fileno(), _SIOCGIWESSID, req)
+    return essid.tobytes().rstrip(b'\0').decode('utf-8', 'replace') or None
+
+
 def get_wifi_status():
     """
     Wi-Fiの詳細ステータスを取得
+    IP・SSIDはioctlで直接カーネルから読む（hostname -I / iwgetidの
+    subprocess起動を省く。失敗時のみ従来のコマンドにフォールバック）
     """
     mode = get_current_mode()
-    
+
     status = {
         'mode': mode,
         'ip_address': None,
         'ssid': None
     }
-    
+
     try:
         # IPアドレスを取得
-        result = subprocess.run(
-            ['hostname', '-I'],
-            capture_output=True, text=True
-        )
-        ips = result.stdout.strip().split()
-        if ips:
-            status['ip_address'] = ips[0]
-        
+        try:
+            status['ip_address'] = _get_interface_ip('wlan0')
+        except OSError:
+            result = subprocess.run(
+                ['hostname', '-I'],
+                capture_output=True, text=True
+            )
+            ips = result.stdout.strip().split()
+            if ips:
+                status['ip_address'] = ips[0]
+
         if mode == 'ap':
             # APモード時はhostapd設定からSSIDを取得
             if os.path.exists(HOSTAPD_CONF):
@@ -76,16 +127,19 @@ def get_wifi_status():
                             break
         else:
             # テザリングモード時は接続中のSSIDを取得
-            result = subprocess.run(
-                ['iwgetid', '-r'],
-                capture_output=True, text=True
-            )
-            if result.returncode == 0:
-                status['ssid'] = result.stdout.strip()
-                
+            try:
+                status['ssid'] = _get_connected_ssid('wlan0')
+            except OSError:
+                result = subprocess.run(
+                    ['iwgetid', '-r'],
+                    capture_output=True, text=True
+                )
+                if result.returncode == 0:
+                    status['ssid'] = result.stdout.strip()
+
     except Exception as e:
         logger.error(f"Failed to get Wi-Fi status: {e}")
-    
+
     return status
 
 
@@ -144,30 +198,29 @@ dhcp-range={AP_DHCP_RANGE_START},{AP_DHCP_RANGE_END},255.255.255.0,24h
         if process.returncode != 0:
             return {'success': False, 'message': f'dnsmasq設定の書き込みに失敗: {process.stderr}'}
         
-        # 3. dhcpcd と wpa_supplicant を停止（これで家のルーターからIPを貰わなくなる）
-        subprocess.run(['sudo', 'systemctl', 'stop', 'dhcpcd'], capture_output=True)
-        subprocess.run(['sudo', 'systemctl', 'stop', 'wpa_supplicant'], capture_output=True)
-        
-        # 4. wlan0に固定IPを設定
-        subprocess.run(['sudo', 'ip', 'addr', 'flush', 'dev', 'wlan0'], capture_output=True)
-        subprocess.run(['sudo', 'ip', 'addr', 'add', f'{AP_IP}/24', 'dev', 'wlan0'], capture_output=True)
-        subprocess.run(['sudo', 'ip', 'link', 'set', 'wlan0', 'up'], capture_output=True)
-        
-        # 5. hostapd と dnsmasq を起動
-        subprocess.run(['sudo', 'systemctl', 'unmask', 'hostapd'], capture_output=True)
-        result = subprocess.run(['sudo', 'systemctl', 'start', 'hostapd'], capture_output=True, text=True)
-        if result.returncode != 0:
-            logger.error(f"hostapd start failed: {result.stderr}")
-            return {'success': False, 'message': f'hostapd起動に失敗: {result.stderr}'}
-        
-        result = subprocess.run(['sudo', 'systemctl', 'start', 'dnsmasq'], capture_output=True, text=True)
+        # 3-5. ネットワーク切り替えを1回のシェル呼び出しにまとめる
+        # （fork+execを10回繰り返す代わりに1回。遷移も途切れにくい）
+        # 停止・IP設定は従来通りベストエフォート、hostapd/dnsmasqの起動だけ
+        # 失敗を検知する
+        script = (
+            'systemctl stop dhcpcd; '
+            'systemctl stop wpa_supplicant; '
+            'ip addr flush dev wlan0; '
+            f'ip addr add {AP_IP}/24 dev wlan0; '
+            'ip link set wlan0 up; '
+            'systemctl unmask hostapd; '
+            'systemctl start hostapd && systemctl start dnsmasq'
+        )
+        result = subprocess.run(['sudo', 'bash', '-c', script],
+                                capture_output=True, text=True)
         if result.returncode != 0:
-            logger.error(f"dnsmasq start failed: {result.stderr}")
-            return {'success': False, 'message': f'dnsmasq起動に失敗: {result.stderr}'}
+            logger.error(f"AP mode network setup failed: {result.stderr}")
+            return {'success': False, 'message': f'APモード起動に失敗: {result.stderr}'}
         
         # 設定を保存
         _save_wifi_settings('ap', ssid, password)
-        
+        _invalidate_mode_cache()
+
         logger.info("Successfully switched to AP mode")
         return {
             'success': True, 
@@ -189,25 +242,23 @@ def switch_to_tethering_mode():
     try:
         logger.info("Switching to tethering mode")
         
-        # 1. hostapd と dnsmasq を停止
-        subprocess.run(['sudo', 'systemctl', 'stop', 'hostapd'], capture_output=True)
-        subprocess.run(['sudo', 'systemctl', 'stop', 'dnsmasq'], capture_output=True)
-        
-        # 2. wlan0のIPをクリア
-        subprocess.run(['sudo', 'ip', 'addr', 'flush', 'dev', 'wlan0'], capture_output=True)
-        
-        # 3. wpa_supplicantを再起動（テザリングWi-Fiに接続）
-        subprocess.run(['sudo', 'systemctl', 'start', 'wpa_supplicant'], capture_output=True)
-        
-        # 4. dhcpcdを再起動してIPを取得
-        subprocess.run(['sudo', 'systemctl', 'restart', 'dhcpcd'], capture_output=True)
-        
+        # 1-4. AP停止→IPクリア→クライアント復帰を1回のシェル呼び出しで実行
+        script = (
+            'systemctl stop hostapd; '
+            'systemctl stop dnsmasq; '
+            'ip addr flush dev wlan0; '
+            'systemctl start wpa_supplicant; '
+            'systemctl restart dhcpcd'
+        )
+        subprocess.run(['sudo', 'bash', '-c', script], capture_output=True)
+
         # 5. 接続を待つ
         time.sleep(5)
         
         # 設定を保存
         _save_wifi_settings('tethering', None, None)
-        
+        _invalidate_mode_cache()
+
         logger.info("Successfully switched to tethering mode")
         return {
             'success': True,
@@ -220,22 +271,35 @@ def switch_to_tethering_mode():
 
 
 def _save_wifi_settings(mode, ssid, password):
-    """Wi-Fi設定を保存"""
+    """Wi-Fi設定を保存
+
+    内容が変わらない場合は書き込みをスキップする（mtimeが動かないので
+    各プロセスの設定キャッシュも無駄に無効化されない）。
+    書く場合は.tmp経由のos.replaceで、読み手が書きかけを見ないようにする。
+    """
     try:
+        raw = None
         settings = {}
         if os.path.exists(SETTINGS_FILE):
             with open(SETTINGS_FILE, 'r') as f:
-                settings = json.load(f)
-        
+                raw = f.read()
+            settings = json.loads(raw)
+
         settings['wifi_mode'] = mode
         if ssid:
             settings['ap_ssid'] = ssid
         if password:
             settings['ap_password'] = password
-        
-        with open(SETTINGS_FILE, 'w') as f:
-            json.dump(settings, f, indent=2)
-            
+
+        serialized = json.dumps(settings, indent=2)
+        if serialized == raw:
+            return
+
+        tmp_path = SETTINGS_FILE + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(serialized)
+        os.replace(tmp_path, SETTINGS_FILE)
+
     except Exception as e:
         logger.error(f"Failed to save Wi-Fi settings: {e}")
 